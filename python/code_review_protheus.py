@@ -15,13 +15,20 @@ Data: 2026-01-11
 import subprocess
 import json
 import sys
+import atexit
+import threading
+import hashlib
 from pathlib import Path
 import re
 from datetime import datetime
 import os
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-import webbrowser
-import base64
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import starmap
+from typing import Callable, NamedTuple, TextIO
 
 # ============================================================
 # Configuracoes
@@ -35,13 +42,19 @@ REPO_PATH = sys.argv[1]
 COMPARE_BRANCH = "origin/master"
 
 os.chdir(REPO_PATH)
-print(f"[INFO] Diretório atual: {os.getcwd()}")
+if __name__ == "__main__":  # no Windows os workers do ProcessPool reimportam o módulo
+    print(f"[INFO] Diretório atual: {os.getcwd()}")
 
 PROJECT_EXTENSIONS = (".prw", ".prx", ".prg")
 ADVPL_EXTENSIONS = (".prw", ".prx", ".ch")
 CONTEXT_RADIUS = 3
 HTML_OUTPUT_DIR = r"C:\Users\BRUNO~1.GOM\AppData\Local\Temp\code_review"
+REPORT_WRITE_BUFFER = 64 * 1024  # buffer de escrita do HTML (bytes)
 PROTHEUS_DOC_LOOKBACK = 40
+# Linhas a analisar (base + adicionadas, somando os arquivos) a partir das quais
+# vale subir processos: no Windows (spawn) o pool custa ~0,1 s antes de analisar
+# a primeira linha, e a análise em série faz ~150 mil linhas/s
+PARALLEL_MIN_LINES = 50000
 
 
 # ============================================================
@@ -53,15 +66,44 @@ ADVPL_ROUTINE_RE = re.compile(
     re.IGNORECASE
 )
 PROTHEUS_DOC_RE = re.compile(r"\{\s*protheus\.doc\s*\}", re.IGNORECASE)
-HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
-
+HUNK_RE = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+IDENTIFIER_RE = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]+\b")
+CONFLICT_RE = re.compile(r"^CONFLICT\s+\([^)]+\):\s+.*?(?:in|Merge conflict in)\s+(.+)$")
+SQL_KEYWORD_RE = re.compile(r"\b(select|insert|update|delete|merge)\b")
+
+# normalize_line
+WHITESPACE_RE = re.compile(r"\s+")
+TOKEN_RE = re.compile(r"\s*(:=|[,()])\s*")
+
+# Declarações Static (função x variável)
+STATIC_FUNCTION_RES = (
+    re.compile(r'^\s*Static\s+Function\s+\w+', re.IGNORECASE),
+    re.compile(r'^\s*Static\s+Func\s+\w+', re.IGNORECASE),
+)
+STATIC_VARIABLE_RES = (
+    re.compile(r'^\s*Static\s+\w+\s*:=', re.IGNORECASE),                 # Static nVar := valor
+    re.compile(r'^\s*Static\s+\w+\s*$', re.IGNORECASE),                  # Static nVar
+    re.compile(r'^\s*Static\s+\w+\s*,', re.IGNORECASE),                  # Static nVar, nVar2
+    re.compile(r'^\s*Static\s+\w+\s+[Aa][Ss]\s+', re.IGNORECASE),        # Static nVar as Numeric
+)
 
-def esc(s):
-    return "" if s is None else str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+# Regras com tratamento especial (3.19, 3.21-3, 3.23)
+CLASS_RE = re.compile(r"\bClass\b", re.IGNORECASE)
+USER_FUNCTION_RE = re.compile(r"^\s*User\s+Function\s+", re.IGNORECASE)
+PRIVATE_RE = re.compile(r"\bPrivate\b", re.IGNORECASE)
+LONG_VAR_RE = re.compile(
+    r"\b(Local|Private|Public|Static)\s+([A-Za-z][A-Za-z0-9_]{10,})\b",
+    re.IGNORECASE
+)
 
 
-def safe_id(text):
-    return re.sub(r"[^A-Za-z0-9_]+", "_", text or "").strip("_") or "x"
+def esc(s) -> str:
+    """
+    Escapa texto para o HTML, inclusive aspas duplas (valores vão em atributos
+    data-*="..."). replace encadeado: para as strings curtas do relatório é mais
+    rápido que str.translate/html.escape.
+    """
+    return "" if s is None else str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
 
 
 # ============================================================
@@ -94,10 +136,12 @@ def strip_inline_comment_advpl(line: str) -> str:
         return s[:pos]
 
 
+@lru_cache(maxsize=32768)
 def normalize_line(line):
     """
     Normaliza linha para comparação (ignora identação/variação de espaços e comentários).
     Evita cortar URLs com http:// ou https://.
+    Memoizada: linhas repetidas (Return, EndIf, ...) são normalizadas uma única vez.
     """
     if not line:
         return ""
@@ -109,13 +153,11 @@ def normalize_line(line):
         return ""
 
     # colapsa whitespace
-    s = re.sub(r"\s+", " ", s)
+    s = WHITESPACE_RE.sub(" ", s)
 
     # remove espaços ao redor de tokens comuns que variam em reidentação
-    s = re.sub(r"\s*(:=)\s*", r"\1", s)
-    s = re.sub(r"\s*(,)\s*", r"\1", s)
-    s = re.sub(r"\s*(\()\s*", r"\1", s)
-    s = re.sub(r"\s*(\))\s*", r"\1", s)
+    # (:=  ,  (  ) numa única varredura)
+    s = TOKEN_RE.sub(r"\1", s)
 
     return s.upper()
 
@@ -129,13 +171,8 @@ def is_static_function_declaration(line):
     - Static     Function NomeFuncao  (múltiplos espaços)
     - Static Func NomeFuncao
     """
-    patterns = [
-        r'^\s*Static\s+Function\s+\w+',
-        r'^\s*Static\s+Func\s+\w+',
-    ]
-
-    for pattern in patterns:
-        if re.search(pattern, line or "", re.IGNORECASE):
+    for pattern in STATIC_FUNCTION_RES:
+        if pattern.search(line or ""):
             return True
 
     return False
@@ -149,15 +186,8 @@ def is_static_variable_declaration(line):
     if is_static_function_declaration(line):
         return False
 
-    patterns = [
-        r'^\s*Static\s+\w+\s*:=',                 # Static nVar := valor
-        r'^\s*Static\s+\w+\s*$',                  # Static nVar
-        r'^\s*Static\s+\w+\s*,',                  # Static nVar, nVar2
-        r'^\s*Static\s+\w+\s+[Aa][Ss]\s+',        # Static nVar as Numeric
-    ]
-
-    for pattern in patterns:
-        if re.search(pattern, line or "", re.IGNORECASE):
+    for pattern in STATIC_VARIABLE_RES:
+        if pattern.search(line or ""):
             return True
 
     return False
@@ -165,14 +195,14 @@ def is_static_variable_declaration(line):
 
 def build_removed_lines_map(file_data):
     """
-    Cria um mapa de linhas removidas (normalizadas) para comparação rápida.
+    Cria o set de linhas removidas (normalizadas) para comparação rápida.
     """
-    removed_map = {}
-    for item in file_data.get("removed", []):
-        normalized = normalize_line(item.get("text", ""))
+    removed = set()
+    for _, text in file_data.get("removed", []):
+        normalized = normalize_line(text)
         if normalized:
-            removed_map.setdefault(normalized, []).append(item.get("text", ""))
-    return removed_map
+            removed.add(normalized)
+    return removed
 
 
 # ============================================================
@@ -187,19 +217,25 @@ def _decode_git_output(raw: bytes) -> str:
         return raw.decode("latin1", errors="replace")
 
 
-def run_git(cmd):
+def run_git_bytes(cmd):
     """
-    Executa git e retorna stdout. Em erro, encerra o script.
+    Executa git e retorna stdout em bytes (sem decodificar). Em erro, encerra o script.
     """
     try:
-        out = subprocess.check_output(["git"] + cmd, stderr=subprocess.STDOUT)
-        return _decode_git_output(out).strip()
+        return subprocess.check_output(["git"] + cmd, stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
         print("[ERRO] Falha ao executar git:", " ".join(cmd))
         print(_decode_git_output(e.output) if isinstance(e.output, bytes) else e.output)
         sys.exit(1)
 
 
+def run_git(cmd):
+    """
+    Executa git e retorna stdout. Em erro, encerra o script.
+    """
+    return _decode_git_output(run_git_bytes(cmd)).strip()
+
+
 def run_git_safe(cmd):
     """
     Executa git e retorna (ok, stdout). Não encerra o script em erro.
@@ -226,7 +262,7 @@ def check_merge_conflicts(compare_branch):
         output = _decode_git_output(proc.stdout) + _decode_git_output(proc.stderr)
         conflicts = []
         for line in output.splitlines():
-            m = re.match(r"^CONFLICT\s+\([^)]+\):\s+.*?(?:in|Merge conflict in)\s+(.+)$", line)
+            m = CONFLICT_RE.match(line)
             if m:
                 conflicts.append(m.group(1).strip())
         return conflicts
@@ -238,6 +274,9 @@ def check_merge_conflicts(compare_branch):
         return []
 
 
+# Getters de informação do repositório: valores fixos durante a execução,
+# memoizados para que chamadas repetidas não subam outro processo git
+@lru_cache(maxsize=None)
 def get_origin_remote_url() -> str:
     ok, out = run_git_safe(["remote", "get-url", "origin"])
     return out.strip() if ok else ""
@@ -253,6 +292,7 @@ def get_repo_display_name(repo_path: str) -> str:
     return os.path.basename(p)
 
 
+@lru_cache(maxsize=None)
 def get_current_branch():
     return run_git(["rev-parse", "--abbrev-ref", "HEAD"])
 
@@ -274,52 +314,153 @@ def get_project_files(base, branch):
     return project_files
 
 
-def get_diff_full(base, files):
+def iter_diff_lines(base, files, context=None):
+    """
+    Executa 'git diff' e entrega o stdout linha a linha (bytes, sem o fim de linha),
+    para o parse começar enquanto o git ainda escreve, sem materializar o diff.
+    context: linhas de contexto por hunk (-U); None usa o padrão do git.
+    A decodificação fica para parse_unified_diff. Em erro, encerra o script.
+    """
     if not files:
-        return ""
-    cmd = ["diff", f"{base}...HEAD", "--"] + files
-    return run_git(cmd)
+        return
+
+    cmd = ["diff", f"{base}...HEAD"]
+    if context is not None:
+        cmd.append(f"-U{context}")
+    cmd += ["--"] + files
+    proc = subprocess.Popen(["git"] + cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with proc:
+        for raw in proc.stdout:
+            yield raw.rstrip(b"\r\n")
+        err = proc.stderr.read()
+
+    if proc.returncode != 0:
+        print("[ERRO] Falha ao executar git:", " ".join(cmd))
+        print(_decode_git_output(err))
+        sys.exit(1)
+
+
+# Processo persistente 'git cat-file --batch' (um único exec por execução)
+_cat_file_proc = None
+_cat_file_lock = threading.Lock()
+
+
+def _get_cat_file_proc():
+    global _cat_file_proc
+    if _cat_file_proc is None or _cat_file_proc.poll() is not None:
+        _cat_file_proc = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=REPO_PATH
+        )
+    return _cat_file_proc
+
+
+def _close_cat_file_proc():
+    global _cat_file_proc
+    proc = _cat_file_proc
+    _cat_file_proc = None
+    if proc is None:
+        return
+    try:
+        proc.stdin.close()
+        proc.wait(timeout=5)
+    except Exception:
+        proc.kill()
+
 
+atexit.register(_close_cat_file_proc)
 
-def get_file_content_at_ref(ref: str, file_path: str) -> str:
+
+def _read_cat_file_record(proc):
     """
-    Lê o conteúdo do arquivo em um ref (ex: origin/master:path/arquivo.prw).
-    Retorna string vazia se não existir.
+    Lê um registro da saída do 'git cat-file --batch'.
+    Retorna bytes, ou None se o objeto não existir (ou não for um blob).
     """
-    ok, out = run_git_safe(["show", f"{ref}:{file_path}"])
-    if not ok:
-        return ""
-    return out
+    # Cabeçalho: "<sha> <tipo> <tamanho>" ou "<objeto> missing" / "<objeto> ambiguous";
+    # o <objeto> ecoado é o "<ref>:<path>" pedido e o caminho pode conter espaços
+    line = proc.stdout.readline().rstrip(b"\n")
+    if line.endswith((b" missing", b" ambiguous")):
+        return None
+
+    header = line.rsplit(b" ", 2)
+    if len(header) != 3 or not header[2].isdigit():
+        return None
 
+    _, obj_type, size = header
+    size = int(size)
+    data = proc.stdout.read(size + 1)[:size]  # +1 = LF final do registro
+    return data if obj_type == b"blob" else None
 
-def build_base_normalized_set(base_ref: str, file_path: str) -> set:
+
+def cat_file_batch(specs):
+    """
+    Lê vários objetos ("<ref>:<path>") numa única passada do 'git cat-file --batch'.
+    As requisições são escritas por uma thread enquanto as respostas são lidas,
+    evitando deadlock quando os pipes enchem. Retorna lista na mesma ordem de specs.
+    """
+    if not specs:
+        return []
+
+    with _cat_file_lock:
+        proc = _get_cat_file_proc()
+        payload = "".join(f"{spec}\n" for spec in specs).encode("utf-8")
+
+        def _write():
+            proc.stdin.write(payload)
+            proc.stdin.flush()
+
+        writer = threading.Thread(target=_write, daemon=True)
+        writer.start()
+        results = [_read_cat_file_record(proc) for _ in specs]
+        writer.join()
+        return results
+
+
+def get_files_content_at_ref(ref: str, file_paths) -> dict:
+    """
+    Lê o conteúdo de vários arquivos em um ref numa única passada.
+    Retorna {path: conteúdo}, com string vazia para os que não existirem.
+    """
+    raws = cat_file_batch([f"{ref}:{fp}" for fp in file_paths])
+    return {
+        fp: (_decode_git_output(raw) if raw else "")
+        for fp, raw in zip(file_paths, raws)
+    }
+
+
+def build_base_normalized_set(content: str) -> set:
     """
     Set de linhas normalizadas do arquivo no base para comparação de legado.
+    Usa normalize_line sem o cache: as linhas do base já ficam guardadas no set
+    e não devem ocupar (nem expulsar) as entradas do cache das linhas do diff.
     """
-    content = get_file_content_at_ref(base_ref, file_path)
     if not content:
         return set()
 
+    normalize = normalize_line.__wrapped__
     base_set = set()
     for ln in content.splitlines():
-        n = normalize_line(ln)
+        n = normalize(ln)
         if n:
             base_set.add(n)
     return base_set
 
 
-def base_has_identifier(base_content: str, identifier: str) -> bool:
+def build_identifier_set(content: str) -> set:
     """
-    Checa se um identificador existe no arquivo base (word boundary).
+    Set (em maiúsculas) dos identificadores do arquivo base.
     Útil para variáveis > 10 chars mesmo quando a linha não bate 100%.
     """
-    if not base_content or not identifier:
-        return False
-    return bool(re.search(rf"\b{re.escape(identifier)}\b", base_content, re.IGNORECASE))
+    if not content:
+        return set()
+    return {m.group(0).upper() for m in IDENTIFIER_RE.finditer(content)}
 
 
 def is_legacy_code(added_line_text, removed_lines_map, base_norm_set=None):
     """
+    removed_lines_map: set de linhas removidas normalizadas (build_removed_lines_map).
     Legado se:
     - a linha (normalizada) aparece nas removidas do diff (movimento/identação), OU
     - a linha (normalizada) existe em qualquer lugar do arquivo no base (origin/master)
@@ -379,21 +520,30 @@ def update_repository():
 # Parsing Diff
 # ============================================================
 
-def parse_unified_diff(diff_text):
+def parse_unified_diff(diff_lines):
+    """
+    Parseia o diff unificado a partir de um iterável de linhas em bytes
+    (ex: iter_diff_lines). Por arquivo:
+    - "added"/"removed": listas de (line_no, text)
+    - "all": lista de (sign, line_no, text) na ordem do diff
+    Caminhos e textos são decodificados individualmente (UTF-8, fallback Latin1).
+    """
     result = {"files": {}}
+    files = result["files"]
     current_file = None
+    cur_added = cur_removed = cur_all = None
     old_line = new_line = None
-    lines = diff_text.splitlines()
 
-    for raw in lines:
-        if raw.startswith("diff --git "):
+    for raw in diff_lines:
+        if raw.startswith(b"diff --git "):
             current_file = None
             old_line = new_line = None
             continue
 
-        if raw.startswith("+++ b/"):
-            current_file = raw.replace("+++ b/", "").strip()
-            result["files"][current_file] = {"added": [], "removed": [], "all": []}
+        if raw.startswith(b"+++ b/"):
+            current_file = _decode_git_output(raw[6:].strip())
+            cur_added, cur_removed, cur_all = [], [], []
+            files[current_file] = {"added": cur_added, "removed": cur_removed, "all": cur_all}
             continue
 
         m = HUNK_RE.match(raw)
@@ -405,47 +555,67 @@ def parse_unified_diff(diff_text):
         if current_file is None:
             continue
 
-        if raw.startswith("--- ") or raw.startswith("index ") or raw.startswith("new file") or raw.startswith("deleted file"):
+        if raw.startswith((b"--- ", b"index ", b"new file", b"deleted file")):
             continue
 
-        if raw.startswith("\\ No newline at end of file"):
+        if raw.startswith(b"\\ No newline at end of file"):
             continue
 
         if old_line is None or new_line is None:
             continue
 
         sign = raw[:1]
-        text = raw[1:] if len(raw) > 0 else ""
+        text = _decode_git_output(raw[1:])
 
-        if sign == "+":
-            result["files"][current_file]["added"].append({"line_no": new_line, "text": text})
-            result["files"][current_file]["all"].append({"sign": "+", "line_no": new_line, "text": text})
+        if sign == b"+":
+            cur_added.append((new_line, text))
+            cur_all.append(("+", new_line, text))
             new_line += 1
-        elif sign == "-":
-            result["files"][current_file]["removed"].append({"line_no": old_line, "text": text})
-            result["files"][current_file]["all"].append({"sign": "-", "line_no": old_line, "text": text})
+        elif sign == b"-":
+            cur_removed.append((old_line, text))
+            cur_all.append(("-", old_line, text))
             old_line += 1
         else:
-            result["files"][current_file]["all"].append({"sign": " ", "line_no": new_line, "text": text})
+            cur_all.append((" ", new_line, text))
             old_line += 1
             new_line += 1
 
     return result
 
 
+def build_context_index(all_lines):
+    """
+    Índice das linhas do diff por número: (line_nos ordenados, posições no diff na
+    mesma ordem). Removidas usam a numeração antiga, então o diff não é ordenado.
+    """
+    order = sorted(range(len(all_lines)), key=lambda k: all_lines[k][1])
+    return [all_lines[k][1] for k in order], order
+
+
 def add_context_to_violations(parsed, violations, radius=3):
-    """Adiciona linhas de contexto ao redor no diff"""
+    """
+    Adiciona linhas de contexto ao redor no diff.
+    Índice por arquivo montado uma vez: cada ocorrência faz duas buscas binárias
+    em vez de varrer o diff inteiro; o contexto sai na ordem do diff.
+    """
+    indexes = {}
     for v in violations:
-        file_diff = parsed["files"].get(v["arquivo"], {})
-        all_lines = file_diff.get("all", [])
+        file_path = v["arquivo"]
+        all_lines = parsed["files"].get(file_path, {}).get("all", [])
+        if file_path not in indexes:
+            indexes[file_path] = build_context_index(all_lines)
+        line_nos, order = indexes[file_path]
 
         for occ in v.get("ocorrencias", []):
             line_no = occ.get("line_no")
             ctx_lines = []
 
-            for l in all_lines:
-                if line_no is not None and abs(l["line_no"] - line_no) <= radius:
-                    ctx_lines.append(l)
+            if line_no is not None:
+                lo = bisect_left(line_nos, line_no - radius)
+                hi = bisect_right(line_nos, line_no + radius)
+                for k in sorted(order[lo:hi]):
+                    sign, l_no, text = all_lines[k]
+                    ctx_lines.append({"sign": sign, "line_no": l_no, "text": text})
 
             occ["contexto"] = ctx_lines
 
@@ -459,7 +629,7 @@ def add_context_to_violations(parsed, violations, radius=3):
 
 def detect_language_from_line(text):
     t = (text or "").lower()
-    if re.search(r"\b(select|insert|update|delete|merge)\b", t):
+    if SQL_KEYWORD_RE.search(t):
         return "sql"
     return "advpl"
 
@@ -471,276 +641,369 @@ def extract_routine_info(line_text):
     return {"tipo": m.group(1).title(), "nome": m.group(2)}
 
 
-def has_protheus_doc_near(file_all_lines, line_no, lookback=PROTHEUS_DOC_LOOKBACK):
-    for x in file_all_lines:
-        if line_no - lookback <= x["line_no"] <= line_no:
-            if PROTHEUS_DOC_RE.search(x.get("text", "")):
-                return True
-    return False
+def build_protheus_doc_lines(file_all_lines):
+    """Números de linha (ordenados) do diff do arquivo que contêm {Protheus.doc}."""
+    return sorted(x_no for _, x_no, x_text in file_all_lines if PROTHEUS_DOC_RE.search(x_text))
+
+
+def has_protheus_doc_near(doc_lines, line_no, lookback=PROTHEUS_DOC_LOOKBACK):
+    """Busca binária pelo {Protheus.doc} mais próximo em [line_no - lookback, line_no]."""
+    i = bisect_right(doc_lines, line_no)
+    return i > 0 and doc_lines[i - 1] >= line_no - lookback
 
 
 # ============================================================
 # Regras
 # ============================================================
 
-def compile_rule(rule):
-    if rule.get("match") == "regex":
-        flags = re.IGNORECASE if rule.get("ignore_case") else 0
-        try:
-            rule["_compiled"] = re.compile(rule.get("padrao", ""), flags)
-        except Exception:
-            rule["_compiled"] = None
-    return rule
+# Regras com tratamento especial (id -> tipo); as demais são genéricas (contains/regex)
+SPECIAL_RULE_KINDS = {
+    "Normativa 3.1": "protheus_doc",
+    "Normativa 3.19": "class_dummy",
+    "Normativa 3.21-2": "static_var",
+    "Normativa 3.21-3": "private",
+    "Normativa 3.23": "long_var",
+}
 
+# Regras avaliadas sobre o arquivo como um todo (as demais são avaliadas linha a linha)
+PER_FILE_RULE_KINDS = ("protheus_doc", "class_dummy")
+
+# Sufixo da descrição das regras que acusam apenas novos usos
+RULE_DESCRIPTION_SUFFIX = {
+    "private": " (novos usos apenas)",
+    "long_var": " (novas variáveis apenas)",
+}
+
+
+class CompiledRule(NamedTuple):
+    """
+    Regra do JSON pré-processada uma vez: os campos usados por linha viram
+    atributos e o casamento (contains/regex) vira a função 'matcher'.
+    """
+    id: str
+    descricao: str
+    severidade: str
+    kind: str  # "generic" ou um dos SPECIAL_RULE_KINDS
+    lang: str
+    alvo: str
+    matcher: Callable[[str], object]
 
-def line_matches_rule(rule, line_text):
+
+def _never_matches(line_text):
+    return False
+
+
+def build_rule_matcher(rule):
+    """Função line_text -> truthy conforme o tipo de match da regra (regex inválida nunca casa)."""
     match_type = (rule.get("match") or "contains").lower()
     padrao = rule.get("padrao", "")
 
     if match_type == "contains":
-        return padrao in (line_text or "")
-    if match_type == "regex":
-        return bool(rule.get("_compiled").search(line_text or "")) if rule.get("_compiled") else False
-    return False
+        return lambda line_text: padrao in line_text
+    if match_type == "regex" and rule.get("match") == "regex":
+        flags = re.IGNORECASE if rule.get("ignore_case") else 0
+        try:
+            return re.compile(padrao, flags).search
+        except Exception:
+            pass
+    return _never_matches
 
 
-def analyze_rules_on_diff(parsed, rules):
+def compile_rule(rule):
+    return CompiledRule(
+        id=rule.get("id"),
+        descricao=rule.get("descricao"),
+        severidade=rule.get("severidade"),
+        kind=SPECIAL_RULE_KINDS.get(rule.get("id", ""), "generic"),
+        lang=(rule.get("linguagem") or "advpl").lower(),
+        alvo=(rule.get("alvo") or "added").lower(),
+        matcher=build_rule_matcher(rule),
+    )
+
+
+def compile_rules(rules):
+    """Compila as regras do JSON (lista de CompiledRule, na ordem do arquivo)."""
+    return [compile_rule(rule) for rule in rules]
+
+
+def file_needs_analysis(file_path, data, compiled_rules):
     """
-    Analisa as regras aplicadas no diff com DETECÇÃO DE CÓDIGO LEGADO:
-    - Legado se a linha já existia no origin/master (mesmo sem aparecer como removed no diff)
+    False quando nenhuma regra pode acusar nada no arquivo: nenhuma regra ativa para
+    a linguagem do arquivo, ou sem linhas adicionadas e sem regra genérica com alvo
+    nas removidas. Evita ler o base no git e montar os sets de legado à toa.
     """
-    violations = []
-    compiled_rules = [compile_rule(dict(r)) for r in rules]
+    is_advpl = (file_path or "").lower().endswith(ADVPL_EXTENSIONS)
+    active = [r for r in compiled_rules if r.lang != "advpl" or is_advpl]
+    if not active:
+        return False
 
-    for file_path, data in parsed["files"].items():
-        file_lower = (file_path or "").lower()
-        is_advpl = file_lower.endswith(ADVPL_EXTENSIONS)
-        added_lines = data.get("added", [])
+    if data.get("added"):
+        return True
 
-        # Mapa de removidas do diff (movimento/reidentação)
-        removed_lines_map = build_removed_lines_map(data)
+    return bool(data.get("removed")) and any(r.kind == "generic" and r.alvo != "added" for r in active)
 
-        # NOVO: base do arquivo (origin/master) para legado
-        base_content = get_file_content_at_ref(COMPARE_BRANCH, file_path)
-        base_norm_set = build_base_normalized_set(COMPARE_BRANCH, file_path)
 
-        for rule in compiled_rules:
-            rule_lang = (rule.get("linguagem") or "advpl").lower()
-            if rule_lang == "advpl" and not is_advpl:
-                continue
+def analyze_file(file_path, data, base_content, base_norm_set, compiled_rules):
+    """
+    Aplica as regras a um arquivo do diff percorrendo as linhas adicionadas UMA vez:
+    cada linha é avaliada por todas as regras (legado calculado no máximo uma vez
+    por linha) e as violações são emitidas no fim, na ordem das regras.
+    """
+    is_advpl = (file_path or "").lower().endswith(ADVPL_EXTENSIONS)
+    rules = [r for r in compiled_rules if r.lang != "advpl" or is_advpl]
+    if not rules:
+        return []
 
-            rule_id = rule.get("id", "")
+    added_lines = data.get("added", [])
 
-            # ======================================================
-            # Normativa 3.1 - Protheus.doc
-            # ======================================================
-            if rule_id == "Normativa 3.1":
-                file_all = data.get("all", [])
-
-                for it in added_lines:
-                    info = extract_routine_info(it.get("text", ""))
-                    if not info:
-                        continue
-
-                    if not has_protheus_doc_near(file_all, it["line_no"], lookback=PROTHEUS_DOC_LOOKBACK):
-                        # Aqui faz sentido continuar acusando se a rotina/classe foi adicionada de fato no diff
-                        violations.append({
-                            "id": rule.get("id"),
-                            "descricao": rule.get("descricao"),
-                            "severidade": rule.get("severidade"),
-                            "arquivo": file_path,
-                            "ocorrencias": [{
-                                "line_no": it["line_no"],
-                                "text": it.get("text", ""),
-                                "info": f"Rotina/Classe '{info['nome']}' sem Protheus.doc",
-                                "is_legacy": False
-                            }]
-                        })
-                continue
+    # Mapa de removidas do diff (movimento/reidentação)
+    removed_lines_map = build_removed_lines_map(data)
+    base_idents = None  # montado sob demanda (Normativa 3.23)
+
+    # Regras por linha: especiais sempre sobre as adicionadas; genéricas conforme o alvo
+    added_rules = []
+    removed_rules = []
+    for i, rule in enumerate(rules):
+        kind = rule.kind
+        if kind in PER_FILE_RULE_KINDS:
+            continue
+        if kind == "generic" and rule.alvo != "added":
+            removed_rules.append((i, rule))
+        else:
+            added_rules.append((i, rule))
+
+    check_doc = any(r.kind == "protheus_doc" for r in rules)
+    check_class = any(r.kind == "class_dummy" for r in rules)
+    need_lang = any(r.lang != "advpl" for _, r in added_rules)
+    # Pré-filtro por substring (minúsculas) antes das regex de palavra inteira:
+    # a grande maioria das linhas não cita Class/User/Private e dispensa a regex
+    need_lower = check_class or any(r.kind == "private" for _, r in added_rules)
+
+    found_occurrences = defaultdict(list)
+    routines = []  # Normativa 3.1: (line_no, text, info) das rotinas adicionadas
+    has_class = has_dummy = False
+
+    for line_no, line_text in added_lines:
+        if check_doc:
+            info = extract_routine_info(line_text)
+            if info:
+                routines.append((line_no, line_text, info))
+
+        line_lower = line_text.lower() if need_lower else None
+
+        if check_class:
+            if not has_class and "class" in line_lower and CLASS_RE.search(line_text):
+                has_class = True
+            if not has_dummy and "user" in line_lower and USER_FUNCTION_RE.search(line_text):
+                has_dummy = True
+
+        lang_line = detect_language_from_line(line_text) if need_lang else None
+        is_legacy = None  # calculado sob demanda, uma vez por linha
+
+        for i, rule in added_rules:
+            kind = rule.kind
 
             # ======================================================
-            # Normativa 3.19 - Conditional
+            # Regras genéricas (aplicadas normalmente)
+            # - se a linha já existia no base => legado => não acusa
             # ======================================================
-            if rule_id == "Normativa 3.19":
-                has_class = any(
-                    re.search(r"\bClass\b", line["text"] or "", re.IGNORECASE)
-                    for line in added_lines
-                )
-
-                if has_class:
-                    has_dummy = any(
-                        re.search(r"^\s*User\s+Function\s+", line["text"] or "", re.IGNORECASE)
-                        for line in added_lines
-                    )
-
-                    if not has_dummy:
-                        violations.append({
-                            "id": rule.get("id"),
-                            "descricao": rule.get("descricao"),
-                            "severidade": rule.get("severidade"),
-                            "arquivo": file_path,
-                            "ocorrencias": [{
-                                "line_no": None,
-                                "text": "(arquivo todo)",
-                                "info": "Arquivo com 'Class' mas sem 'User Function' dummy",
-                                "is_legacy": False
-                            }]
-                        })
-                continue
+            if kind == "generic":
+                if rule.lang != "advpl" and lang_line != rule.lang:
+                    continue
+
+                if not rule.matcher(line_text):
+                    continue
 
             # ======================================================
             # Normativa 3.21-2 (Static)
             # - acusa apenas variáveis Static no escopo global
             # - ignora Static Function / Static Func
-            # - se a linha já existia no base => legado
             # ======================================================
-            if rule_id == "Normativa 3.21-2":
-                found_occurrences = []
-
-                for it in added_lines:
-                    line_text = it.get("text", "")
-
-                    if is_static_variable_declaration(line_text):
-                        is_legacy = is_legacy_code(line_text, removed_lines_map, base_norm_set)
-                        found_occurrences.append({
-                            "line_no": it["line_no"],
-                            "text": line_text,
-                            "is_legacy": is_legacy
-                        })
-
-                real_violations = [occ for occ in found_occurrences if not occ.get("is_legacy")]
-                legacy_code = [occ for occ in found_occurrences if occ.get("is_legacy")]
-
-                if real_violations:
-                    violations.append({
-                        "id": rule.get("id"),
-                        "descricao": rule.get("descricao"),
-                        "severidade": rule.get("severidade"),
-                        "arquivo": file_path,
-                        "ocorrencias": real_violations,
-                        "legacy_count": len(legacy_code)
-                    })
-
-                continue
+            elif kind == "static_var":
+                if not is_static_variable_declaration(line_text):
+                    continue
 
             # ======================================================
-            # Normativa 3.21-3 (Private)
-            # - acusa apenas novos usos de Private
-            # - se a linha já existia no base => legado
+            # Normativa 3.21-3 (Private) - acusa apenas novos usos de Private
             # ======================================================
-            if rule_id == "Normativa 3.21-3":
-                found_occurrences = []
+            elif kind == "private":
+                if "private" not in line_lower or not PRIVATE_RE.search(line_text):
+                    continue
 
-                for it in added_lines:
-                    line_text = it.get("text", "")
+            # ======================================================
+            # Normativa 3.23 (Variáveis > 10 chars)
+            # - acusa apenas novas variáveis
+            # - se o NOME já existia no base => legado (mesmo que a linha não bata igual)
+            # ======================================================
+            elif kind == "long_var":
+                for match in LONG_VAR_RE.finditer(line_text):
+                    var_name = match.group(2)
 
-                    if re.search(r'\bPrivate\b', line_text or "", re.IGNORECASE):
+                    if is_legacy is None:
                         is_legacy = is_legacy_code(line_text, removed_lines_map, base_norm_set)
-                        found_occurrences.append({
-                            "line_no": it["line_no"],
-                            "text": line_text,
-                            "is_legacy": is_legacy
-                        })
+                    if base_idents is None:
+                        base_idents = build_identifier_set(base_content)
+
+                    found_occurrences[i].append({
+                        "line_no": line_no,
+                        "text": line_text,
+                        "info": f"Variável '{var_name}' com {len(var_name)} caracteres",
+                        "is_legacy": is_legacy or var_name.upper() in base_idents
+                    })
+                continue
 
-                real_violations = [occ for occ in found_occurrences if not occ.get("is_legacy")]
-                legacy_code = [occ for occ in found_occurrences if occ.get("is_legacy")]
+            if is_legacy is None:
+                is_legacy = is_legacy_code(line_text, removed_lines_map, base_norm_set)
+
+            found_occurrences[i].append({
+                "line_no": line_no,
+                "text": line_text,
+                "is_legacy": is_legacy
+            })
+
+    # Regras genéricas com alvo nas linhas removidas (sem detecção de legado)
+    if removed_rules:
+        for line_no, line_text in data.get("removed", []):
+            lang_line = detect_language_from_line(line_text)
+            for i, rule in removed_rules:
+                if rule.lang != "advpl" and lang_line != rule.lang:
+                    continue
+                if rule.matcher(line_text):
+                    found_occurrences[i].append({
+                        "line_no": line_no,
+                        "text": line_text,
+                        "is_legacy": False
+                    })
 
-                if real_violations:
+    violations = []
+    doc_lines = None  # Normativa 3.1: montado uma vez, só se houver rotinas adicionadas
+    for i, rule in enumerate(rules):
+        kind = rule.kind
+
+        # ======================================================
+        # Normativa 3.1 - Protheus.doc
+        # ======================================================
+        if kind == "protheus_doc":
+            if routines and doc_lines is None:
+                doc_lines = build_protheus_doc_lines(data.get("all", []))
+
+            for line_no, line_text, info in routines:
+                if not has_protheus_doc_near(doc_lines, line_no, lookback=PROTHEUS_DOC_LOOKBACK):
+                    # Aqui faz sentido continuar acusando se a rotina/classe foi adicionada de fato no diff
                     violations.append({
-                        "id": rule.get("id"),
-                        "descricao": (rule.get("descricao") or "") + " (novos usos apenas)",
-                        "severidade": rule.get("severidade"),
+                        "id": rule.id,
+                        "descricao": rule.descricao,
+                        "severidade": rule.severidade,
                         "arquivo": file_path,
-                        "ocorrencias": real_violations,
-                        "legacy_count": len(legacy_code)
+                        "ocorrencias": [{
+                            "line_no": line_no,
+                            "text": line_text,
+                            "info": f"Rotina/Classe '{info['nome']}' sem Protheus.doc",
+                            "is_legacy": False
+                        }]
                     })
+            continue
 
-                continue
-
-            # ======================================================
-            # Normativa 3.23 (Variáveis > 10 chars)
-            # - acusa apenas novas variáveis
-            # - se o NOME já existia no base => legado (mesmo que a linha não bata igual)
-            # ======================================================
-            if rule_id == "Normativa 3.23":
-                found_occurrences = []
-
-                var_pattern = re.compile(
-                    r'\b(Local|Private|Public|Static)\s+([A-Za-z][A-Za-z0-9_]{10,})\b',
-                    re.IGNORECASE
-                )
+        # ======================================================
+        # Normativa 3.19 - Conditional
+        # ======================================================
+        if kind == "class_dummy":
+            if has_class and not has_dummy:
+                violations.append({
+                    "id": rule.id,
+                    "descricao": rule.descricao,
+                    "severidade": rule.severidade,
+                    "arquivo": file_path,
+                    "ocorrencias": [{
+                        "line_no": None,
+                        "text": "(arquivo todo)",
+                        "info": "Arquivo com 'Class' mas sem 'User Function' dummy",
+                        "is_legacy": False
+                    }]
+                })
+            continue
 
-                for it in added_lines:
-                    line_text = it.get("text", "")
+        found = found_occurrences.get(i, [])
+        real_violations = [occ for occ in found if not occ.get("is_legacy")]
+        legacy_code = [occ for occ in found if occ.get("is_legacy")]
 
-                    for match in var_pattern.finditer(line_text or ""):
-                        var_name = match.group(2)
+        if real_violations:
+            descricao = rule.descricao
+            if kind in RULE_DESCRIPTION_SUFFIX:
+                descricao = (descricao or "") + RULE_DESCRIPTION_SUFFIX[kind]
 
-                        is_legacy_line = is_legacy_code(line_text, removed_lines_map, base_norm_set)
-                        is_legacy_name = base_has_identifier(base_content, var_name)
-                        is_legacy = is_legacy_line or is_legacy_name
+            violations.append({
+                "id": rule.id,
+                "descricao": descricao,
+                "severidade": rule.severidade,
+                "arquivo": file_path,
+                "ocorrencias": real_violations,
+                "legacy_count": len(legacy_code)
+            })
 
-                        found_occurrences.append({
-                            "line_no": it["line_no"],
-                            "text": line_text,
-                            "info": f"Variável '{var_name}' com {len(var_name)} caracteres",
-                            "is_legacy": is_legacy
-                        })
+    return violations
 
-                real_violations = [occ for occ in found_occurrences if not occ.get("is_legacy")]
-                legacy_code = [occ for occ in found_occurrences if occ.get("is_legacy")]
 
-                if real_violations:
-                    violations.append({
-                        "id": rule.get("id"),
-                        "descricao": (rule.get("descricao") or "") + " (novas variáveis apenas)",
-                        "severidade": rule.get("severidade"),
-                        "arquivo": file_path,
-                        "ocorrencias": real_violations,
-                        "legacy_count": len(legacy_code)
-                    })
+# Regras compiladas do processo atual (definidas por _init_analysis_worker)
+_worker_rules = None
 
-                continue
 
-            # ======================================================
-            # Regras genéricas (aplicadas normalmente)
-            # - para alvo=added, se a linha já existia no base => legado => não acusa
-            # ======================================================
-            alvo = (rule.get("alvo") or "added").lower()
-            target_lines = added_lines if alvo == "added" else data.get("removed", [])
+def _init_analysis_worker(rules):
+    """
+    Compila as regras uma vez por processo: as CompiledRule (matchers em closures)
+    não são serializáveis, então cada worker recebe o JSON e compila localmente.
+    """
+    global _worker_rules
+    _worker_rules = compile_rules(rules)
 
-            found_occurrences = []
-            for it in target_lines:
-                line_text = it.get("text", "")
-                lang_line = detect_language_from_line(line_text)
 
-                if rule_lang != "advpl" and lang_line != rule_lang:
-                    continue
+def analyze_file_task(task, compiled_rules):
+    file_path, data, base_content = task
+    base_norm_set = build_base_normalized_set(base_content)
+    return analyze_file(file_path, data, base_content, base_norm_set, compiled_rules)
 
-                if line_matches_rule(rule, line_text):
-                    is_legacy = False
-                    if alvo == "added":
-                        is_legacy = is_legacy_code(line_text, removed_lines_map, base_norm_set)
 
-                    found_occurrences.append({
-                        "line_no": it["line_no"],
-                        "text": line_text,
-                        "is_legacy": is_legacy
-                    })
+def _analyze_file_task(task):
+    """analyze_file_task com as regras compiladas do worker (executor.map)."""
+    return analyze_file_task(task, _worker_rules)
 
-            real_violations = [occ for occ in found_occurrences if not occ.get("is_legacy")]
-            legacy_code = [occ for occ in found_occurrences if occ.get("is_legacy")]
 
-            if real_violations:
-                violations.append({
-                    "id": rule.get("id"),
-                    "descricao": rule.get("descricao"),
-                    "severidade": rule.get("severidade"),
-                    "arquivo": file_path,
-                    "ocorrencias": real_violations,
-                    "legacy_count": len(legacy_code)
-                })
+def analyze_rules_on_diff(parsed, rules):
+    """
+    Analisa as regras aplicadas no diff com DETECÇÃO DE CÓDIGO LEGADO:
+    - Legado se a linha já existia no origin/master (mesmo sem aparecer como removed no diff)
+    Arquivos são independentes: com PARALLEL_MIN_LINES ou mais linhas a analisar,
+    a análise roda em processos (regex é CPU pura, threads ficariam presas no GIL).
+    """
+    # Compiladas aqui para a triagem e a análise em série; os workers recompilam
+    # a partir do JSON (os matchers são closures, não serializáveis)
+    compiled_rules = compile_rules(rules)
+
+    # Base (origin/master) de todos os arquivos analisáveis numa única passada do git
+    files = [fp for fp, data in parsed["files"].items() if file_needs_analysis(fp, data, compiled_rules)]
+    base_contents = get_files_content_at_ref(COMPARE_BRANCH, files)
+    tasks = [(fp, parsed["files"][fp], base_contents[fp]) for fp in files]
+
+    results = None
+    workers = min(len(tasks), os.cpu_count() or 1)
+    work_lines = sum(base.count("\n") + len(data.get("added", ())) for _, data, base in tasks)
+    if work_lines >= PARALLEL_MIN_LINES and workers > 1:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_analysis_worker,
+                initargs=(rules,)
+            ) as executor:
+                results = list(executor.map(_analyze_file_task, tasks))
+        except (OSError, BrokenProcessPool) as exc:
+            print(f"[AVISO] Análise paralela indisponível ({exc}), analisando em série.")
+
+    if results is None:
+        results = [analyze_file_task(task, compiled_rules) for task in tasks]
 
+    violations = []
+    for file_violations in results:
+        violations.extend(file_violations)
     return violations
 
 
@@ -748,28 +1011,9 @@ def analyze_rules_on_diff(parsed, rules):
 # HTML Report Generation
 # ============================================================
 
-def generate_html_report(meta, violations, html_file):
-    """
-    HTML GitHub-like com:
-    - Dark/Light toggle
-    - Watermark (identidade visual Petz Cobasi) via CSS var --brand-bg
-    - Destaque roxo no contador de violações
-    - Cores consistentes para severidade (ALTA/MEDIA/BAIXA) no cabeçalho, borda e badge
-    - Mostra somente a linha do problema e botão "Ver contexto"
-    """
-    repo_display = meta.get("repo_display_name", "") or "(repo não identificado)"
-    
-
-    html = []
-    html.append("<!DOCTYPE html>")
-    html.append('<html lang="pt-BR">')
-    html.append("<head>")
-    html.append('<meta charset="UTF-8">')
-    html.append('<meta name="viewport" content="width=device-width, initial-scale=1.0">')
-    html.append(f"<title>Code Review PROTHEUS - {esc(meta.get('branch_atual'))}</title>")
-
-    html.append("<style>")
-    html.append(r"""
+# CSS/JS estáticos do relatório (iguais em toda execução): gravados uma vez em
+# assets/ por ensure_report_assets e referenciados pelo HTML
+REPORT_CSS = r"""
 :root{
   --bg: #f6f8fa;
   --panel: #ffffff;
@@ -1155,183 +1399,9 @@ body{
 .empty-state-icon{ font-size: 3.2em; margin-bottom: 14px; }
 .empty-state-text{ font-size: 1.25em; font-weight: 900; color: var(--text); margin-bottom: 6px; }
 .empty-state-subtext{ color: var(--muted); }
-""")
-
-    html.append("</style>")
-    html.append("</head>")
-    html.append("<body>")
-
-    html.append('<div class="container">')
-
-    html.append('<div class="header">')
-    html.append('<h1>📋 Code Review PROTHEUS</h1>')
-    html.append(f'<p>Branch: <strong>{esc(meta.get("branch_atual"))}</strong></p>')
-    html.append('</div>')
-
-    # META: "Repositório (origin)" mostra o repo_display_name
-    html.append('<div class="meta-info">')
-    html.append('<div class="meta-grid">')
-
-    html.append('<div class="meta-item">')
-    html.append('<div class="meta-label">Repositório (origin)</div>')
-    html.append(f'<div class="meta-value">{esc(repo_display)}</div>')
-    html.append('</div>')
-
-    html.append('<div class="meta-item">')
-    html.append('<div class="meta-label">Branch Comparada</div>')
-    html.append(f'<div class="meta-value">{esc(meta.get("compare_branch"))}</div>')
-    html.append('</div>')
-
-    html.append('<div class="meta-item">')
-    html.append('<div class="meta-label">Commits à Frente</div>')
-    html.append(f'<div class="meta-value">{meta.get("ahead_commits", 0)}</div>')
-    html.append('</div>')
-
-    html.append('<div class="meta-item">')
-    html.append('<div class="meta-label">Arquivos Alterados</div>')
-    html.append(f'<div class="meta-value">{meta.get("arquivos_alterados", 0)}</div>')
-    html.append('</div>')
-
-    html.append('<div class="meta-item">')
-    html.append('<div class="meta-label">Data da Execução</div>')
-    html.append(f'<div class="meta-value">{esc(meta.get("data_execucao"))}</div>')
-    html.append('</div>')
-
-    html.append('</div>')
-    html.append('</div>')
-
-    # Banner RECUSADO (merge conflicts)
-    conflict_files = meta.get("conflict_files", [])
-    if conflict_files:
-        html.append('<div class="refused-banner">')
-        html.append('<div class="refused-banner-title">RECUSADO - Merge Conflicts Detectados</div>')
-        html.append(f'<div class="refused-banner-text">{len(conflict_files)} arquivo(s) possuem conflitos com <strong>{esc(meta.get("compare_branch"))}</strong>.<br>')
-        html.append('O DEV deve atualizar a branch (merge/rebase de master) e resolver os conflitos antes de reenviar.</div>')
-        html.append('<div style="margin-top:12px;text-align:left;max-width:700px;margin-left:auto;margin-right:auto;">')
-        for cf in conflict_files:
-            html.append(f'<div style="font-family:monospace;font-size:.92em;padding:3px 0;color:var(--sev-crit);">&#x26A0; {esc(cf)}</div>')
-        html.append('</div>')
-        html.append('</div>')
-
-    # Summary
-    total_violations = len(violations)
-    total_legacy = sum(v.get("legacy_count", 0) for v in violations)
-
-    severity_counts = defaultdict(int)
-    for v in violations:
-        sev = v.get("severidade", "MEDIA")
-        severity_counts[sev] += len(v.get("ocorrencias", []))
-
-    html.append('<div class="summary">')
-    html.append(f'<div class="summary-box primary"><span class="summary-number">{total_violations}</span><div class="summary-label">Violações Ativas</div></div>')
-    if severity_counts.get("CRITICA", 0) > 0:
-        html.append(f'<div class="summary-box"><span class="summary-number" style="color:var(--sev-crit);text-shadow:0 0 14px var(--sev-crit-soft);">{severity_counts.get("CRITICA", 0)}</span><div class="summary-label">Merge Conflicts</div></div>')
-    html.append(f'<div class="summary-box"><span class="summary-number" style="color:var(--sev-high);text-shadow:0 0 14px var(--sev-high-soft);">{severity_counts.get("ALTA", 0)}</span><div class="summary-label">Alta Severidade</div></div>')
-    html.append(f'<div class="summary-box"><span class="summary-number" style="color:var(--sev-med);text-shadow:0 0 14px var(--sev-med-soft);">{severity_counts.get("MEDIA", 0)}</span><div class="summary-label">Média Severidade</div></div>')
-    html.append(f'<div class="summary-box"><span class="summary-number" style="color:var(--sev-low);text-shadow:0 0 14px var(--sev-low-soft);">{severity_counts.get("BAIXA", 0)}</span><div class="summary-label">Baixa Severidade</div></div>')
-    html.append(f'<div class="summary-box"><span class="summary-number" style="color:var(--muted);text-shadow:none;">{total_legacy}</span><div class="summary-label">Código Legado Detectado</div></div>')
-    html.append('</div>')
-
-    # Controls + Theme Toggle
-    html.append('<div class="controls">')
-    html.append('<label for="sevFilter">Severidade:</label>')
-    html.append('<select id="sevFilter">')
-    html.append('<option value="">Todas</option>')
-    html.append('<option value="CRITICA">Crítica (Conflicts)</option>')
-    html.append('<option value="ALTA">Alta</option>')
-    html.append('<option value="MEDIA">Média</option>')
-    html.append('<option value="BAIXA">Baixa</option>')
-    html.append('</select>')
-    html.append('<input type="text" id="searchBox" placeholder="🔍 Buscar no código ou descrição...">')
-    html.append('<div class="theme-toggle" id="themeToggle" title="Alternar tema">')
-    html.append('<div class="theme-dot"></div><span id="themeLabel">Dark</span>')
-    html.append('</div>')
-    html.append('<span id="statusText"></span>')
-    html.append('</div>')
-
-    html.append('<div class="content">')
-
-    if not violations:
-        html.append('<div class="empty-state">')
-        html.append('<div class="empty-state-icon">✅</div>')
-        html.append('<div class="empty-state-text">Nenhuma Violação Encontrada!</div>')
-        html.append('<div class="empty-state-subtext">Seu código está em conformidade com a Normativa PROTHEUS.</div>')
-        html.append('</div>')
-    else:
-        violations_by_file = defaultdict(list)
-        for v in violations:
-            violations_by_file[v["arquivo"]].append(v)
-
-        for file_path, file_violations in violations_by_file.items():
-            html.append(f'<div class="file-block" data-file="{esc(file_path)}">')
-            html.append('<div class="file-header">')
-            html.append(f'<span>{esc(file_path)}</span>')
-            html.append(f'<span class="file-badge">{len(file_violations)} violações</span>')
-            html.append('</div>')
-
-            for v in file_violations:
-                sev = v.get("severidade", "MEDIA")  # "ALTA" | "MEDIA" | "BAIXA"
-                rule_id = v.get("id", "")
-                desc = v.get("descricao", "")
-                legacy_count = v.get("legacy_count", 0)
-
-                html.append(f'<div class="violation-item sev-{esc(sev)}" data-severity="{esc(sev)}" data-rule="{esc(rule_id)}">')
-                html.append('<div class="violation-header">')
-                html.append(f'<div class="violation-title">{esc(desc)}</div>')
-                html.append('<div class="badges">')
-                html.append(f'<span class="badge">{esc(rule_id)}</span>')
-                html.append(f'<span class="badge badge-sev sev-{esc(sev)}">{esc(sev)}</span>')
-                if legacy_count > 0:
-                    html.append(f'<span class="badge">+{legacy_count} legado</span>')
-                html.append('</div>')
-                html.append('</div>')
-
-                # mostra SÓ a linha do problema (+) e botão para contexto
-                for occ_idx, occ in enumerate(v.get("ocorrencias", [])):
-                    line_no = occ.get("line_no")
-                    text = occ.get("text", "")
-                    info = occ.get("info", "")
-                    ctx = occ.get("contexto", []) or []
-                    ctx_id = safe_id(f"{file_path}_{rule_id}_{line_no}_{occ_idx}")
-
-                    html.append(f'<div class="occurrence" data-text="{esc(text)}">')
-                    html.append('<div class="occurrence-header">')
-                    if line_no:
-                        html.append(f'<span class="line-number">Linha {line_no}</span>')
-                    if info:
-                        html.append(f'<span style="color: var(--muted); font-size: .92em;">{esc(info)}</span>')
-                    if ctx:
-                        html.append(f'<button class="ctx-btn" type="button" data-ctx="{ctx_id}">Ver contexto</button>')
-                    html.append('</div>')
-
-                    html.append('<div class="code-block">')
-                    html.append(f'<span class="code-line added">+ {esc(text)}</span>')
-                    html.append('</div>')
-
-                    if ctx:
-                        html.append(f'<div class="ctx-wrap" id="{ctx_id}">')
-                        html.append('<div class="code-block" style="margin-top:10px;">')
-                        for c in ctx:
-                            sign = c.get("sign", " ")
-                            c_text = esc(c.get("text", ""))
-                            c_class = "added" if sign == "+" else ("removed" if sign == "-" else "")
-                            html.append(f'<span class="code-line {c_class}">{sign} {c_text}</span>')
-                        html.append('</div>')
-                        html.append('</div>')
-
-                    html.append('</div>')
-
-                html.append('</div>')
-
-            html.append('</div>')
-
-    html.append('</div>')
-    html.append('</div>')
-
-    html.append('<button class="btn-top" id="btnTop">↑</button>')
+"""
 
-    html.append('<script>')
-    html.append(r"""
+REPORT_JS = r"""
 (function(){
   const root = document.documentElement;
   const sevFilter = document.getElementById('sevFilter');
@@ -1363,52 +1433,77 @@ body{
     setTheme(current === 'dark' ? 'light' : 'dark');
   });
 
+  // Consultados uma vez: o texto da busca (textContent do item + data-text das
+  // ocorrências, normalizados) fica em cache; 'hidden' espelha a classe aplicada,
+  // para só mexer no que muda
+  const blocks = Array.from(document.querySelectorAll('.file-block')).map(block=>({
+    el: block,
+    hidden: false,
+    violations: Array.from(block.querySelectorAll('.violation-item')).map(v=>({
+      el: v,
+      hidden: false,
+      sev: v.getAttribute('data-severity'),
+      search: [v.textContent].concat(
+        Array.from(v.querySelectorAll('.occurrence'), o=>o.getAttribute('data-text'))
+      ).map(normalize).join('\n')
+    }))
+  }));
+
+  // Itens cujo estado mudou e ainda não foram aplicados ao DOM
+  const dirty = new Set();
+  let pendingFrame = 0;
+  let pendingStatus = '';
+
+  function mark(item, show){
+    if(item.hidden === !show) return;
+    item.hidden = !show;
+    dirty.add(item);
+  }
+
+  function flushFilters(){
+    pendingFrame = 0;
+    dirty.forEach(item=>{
+      if(item.hidden) item.el.classList.add('hidden');
+      else item.el.classList.remove('hidden');
+    });
+    dirty.clear();
+    statusText.textContent = pendingStatus;
+  }
+
   function applyFilters(){
     const sev = sevFilter.value;
     const q = normalize(searchBox.value);
 
-    const blocks = document.querySelectorAll('.file-block');
+    // Fase de decisão: só dados em cache, nenhuma leitura/escrita no DOM
     let shown = 0;
 
     blocks.forEach(block=>{
       let anyShownInFile = false;
-      const violations = block.querySelectorAll('.violation-item');
-
-      violations.forEach(v=>{
-        let showViolation = true;
-
-        if(sev && v.getAttribute('data-severity') !== sev) showViolation = false;
-
-        const vText = normalize(v.textContent);
-
-        if(q && vText.indexOf(q) === -1) {
-          let occMatch = false;
-          const occs = v.querySelectorAll('.occurrence');
-          occs.forEach(o=>{
-            const oText = normalize(o.getAttribute('data-text'));
-            if(oText.indexOf(q) !== -1) occMatch = true;
-          });
-          if(!occMatch) showViolation = false;
-        }
 
+      block.violations.forEach(v=>{
+        const showViolation = (!sev || v.sev === sev) && (!q || v.search.indexOf(q) !== -1);
         if(showViolation){
-          v.classList.remove('hidden');
           anyShownInFile = true;
           shown++;
-        }else{
-          v.classList.add('hidden');
         }
+        mark(v, showViolation);
       });
 
-      if(anyShownInFile) block.classList.remove('hidden');
-      else block.classList.add('hidden');
+      mark(block, anyShownInFile);
     });
 
-    statusText.textContent = shown ? (shown + ' violação(ões) visível(is)') : 'Nenhuma violação com esse filtro';
+    pendingStatus = shown ? (shown + ' violação(ões) visível(is)') : 'Nenhuma violação com esse filtro';
+
+    // Fase de escrita: todas as mutações num único frame (um recálculo de estilo)
+    if(!pendingFrame) pendingFrame = requestAnimationFrame(flushFilters);
   }
 
+  let searchTimer = null;
   sevFilter.addEventListener('change', applyFilters);
-  searchBox.addEventListener('input', applyFilters);
+  searchBox.addEventListener('input', ()=>{
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(applyFilters, 80);
+  });
 
   window.addEventListener('scroll', function(){
     btnTop.style.display = (window.pageYOffset > 300) ? 'block' : 'none';
@@ -1430,14 +1525,296 @@ body{
 
   applyFilters();
 })();
+"""
+
+# Nomes dos assets com o hash do conteúdo: cada versão do CSS/JS ganha arquivo próprio
+# e os relatórios antigos continuam apontando para a versão com que foram gerados
+REPORT_CSS_FILE = f"cr.{hashlib.sha256(REPORT_CSS.encode('utf-8')).hexdigest()[:8]}.css"
+REPORT_JS_FILE = f"cr.{hashlib.sha256(REPORT_JS.encode('utf-8')).hexdigest()[:8]}.js"
+
+# Filtros + Theme Toggle
+REPORT_CONTROLS_HTML = """<div class="controls">
+<label for="sevFilter">Severidade:</label>
+<select id="sevFilter">
+<option value="">Todas</option>
+<option value="CRITICA">Crítica (Conflicts)</option>
+<option value="ALTA">Alta</option>
+<option value="MEDIA">Média</option>
+<option value="BAIXA">Baixa</option>
+</select>
+<input type="text" id="searchBox" placeholder="🔍 Buscar no código ou descrição...">
+<div class="theme-toggle" id="themeToggle" title="Alternar tema">
+<div class="theme-dot"></div><span id="themeLabel">Dark</span>
+</div>
+<span id="statusText"></span>
+</div>
+"""
+
+REPORT_META_ITEM = """<div class="meta-item">
+<div class="meta-label">{label}</div>
+<div class="meta-value">{value}</div>
+</div>
+"""
+
+REPORT_SUMMARY_BOX = (
+    '<div class="summary-box"><span class="summary-number" style="{style}">{number}</span>'
+    '<div class="summary-label">{label}</div></div>\n'
+)
+
+# Caixas de severidade do resumo: (severidade, variável CSS da cor, rótulo)
+REPORT_SEVERITY_BOXES = (
+    ("CRITICA", "--sev-crit", "Merge Conflicts"),
+    ("ALTA", "--sev-high", "Alta Severidade"),
+    ("MEDIA", "--sev-med", "Média Severidade"),
+    ("BAIXA", "--sev-low", "Baixa Severidade"),
+)
+
+REPORT_EMPTY_STATE_HTML = """<div class="empty-state">
+<div class="empty-state-icon">✅</div>
+<div class="empty-state-text">Nenhuma Violação Encontrada!</div>
+<div class="empty-state-subtext">Seu código está em conformidade com a Normativa PROTHEUS.</div>
+</div>
+"""
+
+
+def _write_file_atomic(path: str, data: bytes) -> None:
+    """Grava bytes via arquivo temporário + os.replace: quem lê nunca vê o arquivo pela metade."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def ensure_report_assets(output_dir: str) -> None:
+    """
+    Grava REPORT_CSS/REPORT_JS em <output_dir>/assets (REPORT_CSS_FILE/REPORT_JS_FILE),
+    referenciados pelos relatórios em vez de embutidos em cada um. O nome leva o hash
+    do conteúdo: se o arquivo já existe, é esta mesma versão e não é regravado.
+    """
+    assets_dir = os.path.join(output_dir, "assets")
+    os.makedirs(assets_dir, exist_ok=True)
+
+    for name, content in ((REPORT_CSS_FILE, REPORT_CSS), (REPORT_JS_FILE, REPORT_JS)):
+        path = os.path.join(assets_dir, name)
+        if not os.path.exists(path):
+            _write_file_atomic(path, content.encode("utf-8"))
+
+
+def fmt_ctx_line(sign: str, text: str) -> str:
+    """Uma linha de contexto em HTML."""
+    c_class = "added" if sign == "+" else ("removed" if sign == "-" else "")
+    return f'<span class="code-line {c_class}">{sign} {esc(text)}</span>\n'
+
+
+@lru_cache(maxsize=4096)
+def render_ctx_lines(ctx_key: tuple) -> str:
+    """
+    Linhas de contexto de uma ocorrência já em HTML, a partir de ((sign, text), ...).
+    Memoizada: a mesma linha acusada por várias regras tem o mesmo contexto,
+    que assim é escapado e formatado uma vez só.
+    """
+    return "".join(starmap(fmt_ctx_line, ctx_key))
+
+
+def generate_html_report(meta: dict, violations: list, html_file: str) -> None:
+    """
+    HTML GitHub-like com:
+    - Dark/Light toggle
+    - Watermark (identidade visual Petz Cobasi) via CSS var --brand-bg
+    - Destaque roxo no contador de violações
+    - Cores consistentes para severidade (ALTA/MEDIA/BAIXA) no cabeçalho, borda e badge
+    - Mostra somente a linha do problema e botão "Ver contexto"
+    O documento é escrito bloco a bloco direto no arquivo, sem montar o HTML
+    inteiro em memória. CSS/JS ficam em assets/ ao lado do relatório.
+    """
+    ensure_report_assets(os.path.dirname(os.path.abspath(html_file)))
+
+    # Modo texto de propósito: o TextIOWrapper (em C) junta e codifica os fragmentos
+    # em blocos; bytearray + encode por fragmento em Python mediu ~10% mais lento
+    with open(html_file, "w", encoding="utf-8", newline="\n", buffering=REPORT_WRITE_BUFFER) as f:
+        _write_html_report(f, meta, violations)
+
+
+def _write_html_report(f: TextIO, meta: dict, violations: list) -> None:
+    """
+    Escreve o relatório em f (CSS/JS via assets/REPORT_CSS_FILE e assets/REPORT_JS_FILE);
+    cada bloco é um f-string terminado em quebra de linha.
+    """
+    repo_display = meta.get("repo_display_name", "") or "(repo não identificado)"
+
+    # Campos do meta repetidos no documento: escapados uma vez
+    branch_esc = esc(meta.get("branch_atual"))
+    compare_branch_esc = esc(meta.get("compare_branch"))
+
+    f.write(f"""<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Code Review PROTHEUS - {branch_esc}</title>
+<link rel="stylesheet" href="assets/{REPORT_CSS_FILE}">
+</head>
+<body>
+<div class="container">
+<div class="header">
+<h1>📋 Code Review PROTHEUS</h1>
+<p>Branch: <strong>{branch_esc}</strong></p>
+</div>
+""")
+
+    # META: "Repositório (origin)" mostra o repo_display_name
+    meta_items = (
+        ("Repositório (origin)", esc(repo_display)),
+        ("Branch Comparada", compare_branch_esc),
+        ("Commits à Frente", meta.get("ahead_commits", 0)),
+        ("Arquivos Alterados", meta.get("arquivos_alterados", 0)),
+        ("Data da Execução", esc(meta.get("data_execucao"))),
+    )
+    f.write('<div class="meta-info">\n<div class="meta-grid">\n')
+    f.write("".join(REPORT_META_ITEM.format(label=label, value=value) for label, value in meta_items))
+    f.write('</div>\n</div>\n')
+
+    # Banner RECUSADO (merge conflicts)
+    conflict_files = meta.get("conflict_files", [])
+    if conflict_files:
+        conflict_lines = "".join(
+            f'<div style="font-family:monospace;font-size:.92em;padding:3px 0;color:var(--sev-crit);">&#x26A0; {esc(cf)}</div>\n'
+            for cf in conflict_files
+        )
+        f.write(f"""<div class="refused-banner">
+<div class="refused-banner-title">RECUSADO - Merge Conflicts Detectados</div>
+<div class="refused-banner-text">{len(conflict_files)} arquivo(s) possuem conflitos com <strong>{compare_branch_esc}</strong>.<br>
+O DEV deve atualizar a branch (merge/rebase de master) e resolver os conflitos antes de reenviar.</div>
+<div style="margin-top:12px;text-align:left;max-width:700px;margin-left:auto;margin-right:auto;">
+{conflict_lines}</div>
+</div>
 """)
-    html.append('</script>')
 
-    html.append("</body>")
-    html.append("</html>")
+    # Summary + agrupamento por arquivo numa única passada
+    total_violations = len(violations)
+    total_legacy = 0
+    severity_counts = {}
+    violations_by_file = {}
+    for v in violations:
+        file_violations = violations_by_file.get(v["arquivo"])
+        if file_violations is None:
+            file_violations = violations_by_file[v["arquivo"]] = []
+        file_violations.append(v)
 
-    with open(html_file, "w", encoding="utf-8", newline="\n") as f:
-        f.write("\n".join(html))
+        sev = v.get("severidade", "MEDIA")
+        severity_counts[sev] = severity_counts.get(sev, 0) + len(v.get("ocorrencias", []))
+        total_legacy += v.get("legacy_count", 0)
+
+    summary_boxes = []
+    for sev, var, label in REPORT_SEVERITY_BOXES:
+        count = severity_counts.get(sev, 0)
+        if sev == "CRITICA" and not count:
+            continue  # Merge Conflicts só quando houver
+        summary_boxes.append((f"color:var({var});text-shadow:0 0 14px var({var}-soft);", count, label))
+    summary_boxes.append(("color:var(--muted);text-shadow:none;", total_legacy, "Código Legado Detectado"))
+
+    f.write(f"""<div class="summary">
+<div class="summary-box primary"><span class="summary-number">{total_violations}</span><div class="summary-label">Violações Ativas</div></div>
+""")
+    f.write("".join(
+        REPORT_SUMMARY_BOX.format(style=style, number=number, label=label)
+        for style, number, label in summary_boxes
+    ))
+    f.write('</div>\n')
+
+    # Controls + Theme Toggle
+    f.write(REPORT_CONTROLS_HTML)
+
+    f.write('<div class="content">\n')
+
+    if not violations:
+        f.write(REPORT_EMPTY_STATE_HTML)
+    else:
+        ctx_seq = 0  # ids dos blocos de contexto: só precisam ser únicos dentro do documento
+
+        for file_path, file_violations in violations_by_file.items():
+            file_path_esc = esc(file_path)
+            f.write(f"""<div class="file-block" data-file="{file_path_esc}">
+<div class="file-header">
+<span>{file_path_esc}</span>
+<span class="file-badge">{len(file_violations)} violações</span>
+</div>
+""")
+
+            for v in file_violations:
+                sev = v.get("severidade", "MEDIA")  # "ALTA" | "MEDIA" | "BAIXA"
+                rule_id = v.get("id", "")
+                desc = v.get("descricao", "")
+                legacy_count = v.get("legacy_count", 0)
+                sev_esc = esc(sev)
+                rule_id_esc = esc(rule_id)
+
+                legacy_html = f'<span class="badge">+{legacy_count} legado</span>\n' if legacy_count > 0 else ""
+
+                f.write(f"""<div class="violation-item sev-{sev_esc}" data-severity="{sev_esc}" data-rule="{rule_id_esc}">
+<div class="violation-header">
+<div class="violation-title">{esc(desc)}</div>
+<div class="badges">
+<span class="badge">{rule_id_esc}</span>
+<span class="badge badge-sev sev-{sev_esc}">{sev_esc}</span>
+{legacy_html}</div>
+</div>
+""")
+
+                # mostra SÓ a linha do problema (+) e botão para contexto
+                for occ in v.get("ocorrencias", []):
+                    line_no = occ.get("line_no")
+                    text = occ.get("text", "")
+                    info = occ.get("info", "")
+                    ctx = occ.get("contexto", []) or []
+
+                    line_html = f'<span class="line-number">Linha {line_no}</span>\n' if line_no else ""
+                    info_html = f'<span style="color: var(--muted); font-size: .92em;">{esc(info)}</span>\n' if info else ""
+                    btn_html = ""
+                    ctx_html = ""
+                    if ctx:
+                        ctx_id = f"c{ctx_seq}"
+                        ctx_seq += 1
+                        btn_html = f'<button class="ctx-btn" type="button" data-ctx="{ctx_id}">Ver contexto</button>\n'
+                        ctx_key = tuple((c.get("sign", " "), c.get("text", "")) for c in ctx)
+                        ctx_html = f"""<div class="ctx-wrap" id="{ctx_id}">
+<div class="code-block" style="margin-top:10px;">
+{render_ctx_lines(ctx_key)}</div>
+</div>
+"""
+
+                    text_esc = esc(text)
+                    f.write(f"""<div class="occurrence" data-text="{text_esc}">
+<div class="occurrence-header">
+{line_html}{info_html}{btn_html}</div>
+<div class="code-block">
+<span class="code-line added">+ {text_esc}</span>
+</div>
+{ctx_html}</div>
+""")
+
+                f.write('</div>\n')
+
+            f.write('</div>\n')
+
+    f.write(f"""</div>
+</div>
+<button class="btn-top" id="btnTop">↑</button>
+<script defer src="assets/{REPORT_JS_FILE}"></script>
+</body>
+</html>""")
+
+
+def open_html_report(html_file):
+    """Abre o relatório no navegador padrão (falha ao abrir não interrompe o review)."""
+    import webbrowser  # local: só é carregado quando o relatório é aberto
+
+    try:
+        # as_uri gera file:///C:/... com barras normais; o f"file:///{html_file}" de
+        # antes mantinha as barras invertidas do Windows e gerava uma URL inválida
+        webbrowser.open(Path(html_file).resolve().as_uri())
+    except Exception:
+        pass
 
 
 
@@ -1454,9 +1831,12 @@ def _build_conflict_violations(conflict_files):
     """
     if not conflict_files:
         return []
-    violations = []
-    for cfile in conflict_files:
-        violations.append({
+    info_suffix = (
+        f" possui conflitos com {COMPARE_BRANCH}. "
+        "O DEV deve atualizar a branch (merge/rebase de master) e resolver os conflitos antes de reenviar."
+    )
+    return [
+        {
             "id": "MERGE_CONFLICT",
             "descricao": "Merge conflict detectado - branch desatualizada com master",
             "severidade": "CRITICA",
@@ -1464,14 +1844,14 @@ def _build_conflict_violations(conflict_files):
             "ocorrencias": [{
                 "line_no": None,
                 "text": "(arquivo inteiro)",
-                "info": f"O arquivo '{cfile}' possui conflitos com {COMPARE_BRANCH}. "
-                        "O DEV deve atualizar a branch (merge/rebase de master) e resolver os conflitos antes de reenviar.",
+                "info": f"O arquivo '{cfile}'{info_suffix}",
                 "is_legacy": False,
                 "contexto": []
             }],
             "legacy_count": 0
-        })
-    return violations
+        }
+        for cfile in conflict_files
+    ]
 
 
 def load_rules():
@@ -1494,6 +1874,16 @@ def load_rules():
 # Main
 # ============================================================
 
+def print_json(obj):
+    """
+    Escreve obj como JSON compacto numa única linha do stdout (o CodeReviewTool
+    lê a primeira linha após o marcador). json.dumps usa o encoder em C;
+    json.dump direto no stream cai no encoder em Python e é mais lento.
+    """
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
+    sys.stdout.write("\n")
+
+
 def main():
     os.chdir(REPO_PATH)
     print(f"[INFO] Diretório atual: {os.getcwd()}")
@@ -1507,17 +1897,27 @@ def main():
     # CORREÇÃO: Atualiza repositório (pull + fetch)
     update_repository()
 
+    # Consultas independentes ao git em paralelo (cada uma só espera o subprocess):
+    # o tempo total fica no da mais lenta, não na soma. Os arquivos alterados ficam
+    # de fora: só são consultados depois, quando há commits à frente
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        conflicts_future = executor.submit(check_merge_conflicts, COMPARE_BRANCH)
+        # Usa HEAD em vez do nome da branch para evitar problemas de encoding
+        ahead_behind_future = executor.submit(get_ahead_behind, COMPARE_BRANCH, "HEAD")
+        origin_url_future = executor.submit(get_origin_remote_url)
+
     # Verifica merge conflicts contra a branch de comparação
-    conflict_files = check_merge_conflicts(COMPARE_BRANCH)
-    if conflict_files:
-        print(f"[AVISO] Merge conflicts detectados em {len(conflict_files)} arquivo(s):")
+    conflict_files = conflicts_future.result()
+    n_conflicts = len(conflict_files)
+    has_conflicts = n_conflicts > 0
+    if has_conflicts:
+        print(f"[AVISO] Merge conflicts detectados em {n_conflicts} arquivo(s):")
         for cf in conflict_files:
             print(f"  - {cf}")
     else:
         print("[INFO] Nenhum merge conflict detectado.")
 
-    # Usa HEAD em vez do nome da branch para evitar problemas de encoding
-    ahead, behind = get_ahead_behind(COMPARE_BRANCH, "HEAD")
+    ahead, behind = ahead_behind_future.result()
     print(f"[INFO] Commits à frente (analisados): {ahead}")
     print(f"[INFO] Commits atrás (ignorado): {behind}")
 
@@ -1538,7 +1938,6 @@ def main():
         conflict_violations = _build_conflict_violations(conflict_files)
         violations.extend(conflict_violations)
 
-        has_conflicts = len(conflict_files) > 0
         review_status = "RECUSADO" if has_conflicts else "OK"
 
         meta = {
@@ -1553,7 +1952,7 @@ def main():
             "conflict_files": conflict_files,
 
             # se quiser manter origin_url no meta (não aparece no HTML, mas ok)
-            "origin_url": get_origin_remote_url(),
+            "origin_url": origin_url_future.result(),
         }
 
         # >>> adiciona DEPOIS que meta existe
@@ -1562,13 +1961,10 @@ def main():
         generate_html_report(meta, violations, html_file)
         print(f"[INFO] HTML gerado em: {html_file}")
 
-        try:
-            webbrowser.open(f"file:///{html_file}")
-        except Exception:
-            pass
+        open_html_report(html_file)
 
         print("[JSON_RESULT]")
-        print(json.dumps({
+        print_json({
             "status": review_status,
             "branch": CURRENT_BRANCH,
             "compare_branch": COMPARE_BRANCH,
@@ -1576,13 +1972,13 @@ def main():
             "behind_commits": behind,
             "arquivos_alterados": 0,
             "violacoes": len(violations),
-            "merge_conflicts": len(conflict_files),
+            "merge_conflicts": n_conflicts,
             "legacy_code_count": 0,
             "html_file": html_file
-        }, ensure_ascii=False))
+        })
 
         print("[JSON_VIOLATIONS]")
-        print(json.dumps(violations, ensure_ascii=False))
+        print_json(violations)
 
         msg_suffix = " (RECUSADO - merge conflicts)" if has_conflicts else " (sem commits abertos)"
         print(f"[INFO] Code Review finalizado{msg_suffix}.")
@@ -1595,8 +1991,9 @@ def main():
     advpl_files = [f for f in project_files if f.lower().endswith(".prw")]
 
     rules = load_rules()
-    diff_text = get_diff_full(COMPARE_BRANCH, advpl_files)
-    parsed = parse_unified_diff(diff_text)
+    # Um único diff com contexto: as regras olham as linhas +/-, a Normativa 3.1 procura
+    # o {Protheus.doc} também no contexto e o relatório mostra o contexto das violações
+    parsed = parse_unified_diff(iter_diff_lines(COMPARE_BRANCH, advpl_files, context=CONTEXT_RADIUS))
 
     print("[INFO] Analisando regras com detecção de código legado (origin/master)...")
     violations = analyze_rules_on_diff(parsed, rules)
@@ -1606,13 +2003,12 @@ def main():
     conflict_violations = _build_conflict_violations(conflict_files)
     violations = conflict_violations + violations
 
-    has_conflicts = len(conflict_files) > 0
     total_legacy = sum(v.get("legacy_count", 0) for v in violations)
     rule_violations = [v for v in violations if v.get("id") != "MERGE_CONFLICT"]
 
     print(f"[INFO] Violações ativas encontradas: {len(rule_violations)}")
     if has_conflicts:
-        print(f"[AVISO] Merge conflicts: {len(conflict_files)} arquivo(s) - REVIEW RECUSADO")
+        print(f"[AVISO] Merge conflicts: {n_conflicts} arquivo(s) - REVIEW RECUSADO")
     print(f"[INFO] Código legado detectado: {total_legacy} ocorrências (não-contabilizadas como violações)")
 
     review_status = "RECUSADO" if has_conflicts else ("OK" if len(rule_violations) == 0 else "OK")
@@ -1628,7 +2024,7 @@ def main():
         "data_execucao": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
         "conflict_files": conflict_files,
 
-        "origin_url": get_origin_remote_url(),
+        "origin_url": origin_url_future.result(),
     }
 
     # >>> adiciona DEPOIS que meta existe
@@ -1637,13 +2033,10 @@ def main():
     generate_html_report(meta, violations, html_file)
     print(f"[INFO] HTML gerado em: {html_file}")
 
-    try:
-        webbrowser.open(f"file:///{html_file}")
-    except Exception:
-        pass
+    open_html_report(html_file)
 
     print("[JSON_RESULT]")
-    print(json.dumps({
+    print_json({
         "status": review_status,
         "branch": CURRENT_BRANCH,
         "compare_branch": COMPARE_BRANCH,
@@ -1651,13 +2044,13 @@ def main():
         "behind_commits": behind,
         "arquivos_alterados": len(project_files),
         "violacoes": len(violations),
-        "merge_conflicts": len(conflict_files),
+        "merge_conflicts": n_conflicts,
         "legacy_code_count": total_legacy,
         "html_file": html_file
-    }, ensure_ascii=False))
+    })
 
     print("[JSON_VIOLATIONS]")
-    print(json.dumps(violations, ensure_ascii=False))
+    print_json(violations)
 
     msg_suffix = " (RECUSADO - merge conflicts)" if has_conflicts else " com sucesso"
     print(f"[INFO] Code Review finalizado{msg_suffix}.")